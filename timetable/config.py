@@ -76,6 +76,40 @@ def parse_config(filename):
         return config
 
 
+def unstructure_config(config):
+    ''' Convert a parsed config into json-compatible types.
+
+    Args:
+        config (dict): The parsed config file.
+
+    Returns:
+        dict: The config with TermColour values replaced by their names. '''
+    return {
+        section: {
+            key: value.name if isinstance(value, TermColour) else value
+            for key, value in options.items()
+        }
+        for section, options in config.items()
+    }
+
+
+def structure_config(config_dict):
+    ''' Convert the output of unstructure_config back into a parsed config.
+
+    Args:
+        config_dict (dict): The dictionary to reconstruct from.
+
+    Returns:
+        dict: The parsed config with TermColour values restored. '''
+    return {
+        section: {
+            key: TermColour[value] if key == 'colour' else value
+            for key, value in options.items()
+        }
+        for section, options in config_dict.items()
+    }
+
+
 def get_courses(config):
     ''' Get a list of courses from the parsed config file.
 
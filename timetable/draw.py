@@ -63,9 +63,9 @@ def timeline(canvas, x, y, box_width, box_height, mapping):
         y (int): Top left of timeline (x-pos).
         box_width (int): The width of the boxes to draw around timeline items
         box_width (int): The height of the boxes to draw around timeline items.
-        mapping (OrderedDict): A mapping of keys (on the left of the
-                               dividing line), and values (on the
-                               right of the dividing line).
+        mapping (dict): An insertion-ordered mapping of keys (on the
+                        left of the dividing line), and values (on the
+                        right of the dividing line).
 
     Examples:
         See timeline.png for an example output. '''
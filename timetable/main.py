@@ -1,54 +1,21 @@
-""" Print, display, and manage your UC timetable.
-
-Usage:
-    timetable [-v] show [--on=<date>] [--drop-cache] [--timeline]
-    timetable [-v] week [--on=<date>] [--drop-cache]
-    timetable [-v] next [--time] [--drop-cache]
-
-Options:
-    -h, --help         Show this screen.
-    --on=<date>        Show the timetable for this date.
-    --drop-cache       Drop the current data file.
-    --time             Show the time to the next class.
-    -t, --timeline     Show your timetable in a fancy timeline.
-    -v, --verbose      Be more verbose.
-"""
+""" Print, display, and manage your UC timetable. """
+import argparse
 import calendar
 import itertools
+import json
 import os
 import pathlib
-import pickle
-from collections import OrderedDict, defaultdict
+import sys
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
-from drawille import Canvas
+from schema import SchemaError
 
-from docopt import docopt
-from schema import Or, Schema, SchemaError, Use
-
-from . import config, draw, timetable
+from . import config, timetable
 
 COMMAND_MAP = {}
 
-COMMAND_SCHEMA = Schema({
-    '--on':
-    Or(Use(lambda v: datetime.strptime(v, '%Y-%m-%d')), None),
-    '--drop-cache':
-    bool,
-    '--time':
-    bool,
-    'next':
-    bool,
-    'show':
-    bool,
-    'week':
-    bool,
-    '--verbose':
-    bool,
-    '--timeline':
-    bool
-})
-
 
 def command(name):
     ''' Declare a command to be used by the argument parser.
@@ -73,6 +40,10 @@ def get_config():
     "the config directory" in this context means the path specified by
     the TIMETABLE_CONFIG_PATH environment variable.
 
+    The data file is only trusted if it was written against the
+    current config file; if the config file has been modified since,
+    the cached courses and config are discarded and rebuilt.
+
     Returns:
         (pathlib.Path, list of courses, dict): The
         path to the configuration directory, the list of courses found in
@@ -81,32 +52,65 @@ def get_config():
     data_path = config_path / 'data'
     config_file = config_path / 'config'
     data = None
+    config_dict = None
     if data_path.exists():
-        with open(data_path, 'rb') as infile:
-            data = pickle.load(infile)
-    return config_path, data, config.parse_config(config_file)
+        with open(data_path, 'r') as infile:
+            try:
+                cache = json.load(infile)
+            except ValueError:
+                # Not json - e.g. a pickle written by an older version,
+                # which fails to even decode as text. Treat any such
+                # file as a cache miss. (JSONDecodeError and
+                # UnicodeDecodeError are both ValueErrors.)
+                cache = {}
+        if cache.get('config_mtime') == config_file.stat().st_mtime:
+            data = [
+                timetable.Course.from_dict(course)
+                for course in cache['courses']
+            ]
+            # The parsed config rides along in the cache, so a fresh
+            # cache also skips re-parsing and re-validating the
+            # config file.
+            if 'config' in cache:
+                config_dict = config.structure_config(cache['config'])
+    if config_dict is None:
+        config_dict = config.parse_config(config_file)
+    return config_path, data, config_dict
+
+
+def format_time(time):
+    ''' Format a time of day as HH:MM.
+
+    This is a fast path for the common case; it avoids the format
+    string parsing strftime does on every call.
+
+    Args:
+        time (datetime.time): The time to format.
+
+    Returns:
+        str: The time in HH:MM form. '''
+    return f'{time.hour:02d}:{time.minute:02d}'
 
 
-def print_activity(config_dict, date, course, activity):
-    ''' Print an activity.
+def format_activity(colour, date, course, activity):
+    ''' Format an activity as a single printable line.
 
-    Prints an activity in the context of the course it belongs to, the
-    current date, and the colours specified by the user.
+    Formats an activity in the context of the course it belongs to,
+    the current date, and the colours specified by the user.
 
     Args:
-        config_dict (dict): Used to obtain the colour to print the course
-                       in.
+        colour (config.TermColour): The colour to print the course in.
         date (datetime.datetime): The date to filter locations by.
         course (timetable.Course): The parent course of the activity.
-        activity (timetable.Activity): The activity to print. '''
+        activity (timetable.Activity): The activity to format.
+
+    Returns:
+        str: The formatted activity line. '''
     relevant_location = activity.location_valid_for(date)
-    start = activity.start.strftime('%H:%M')
-    colour = config.colour_of_course(config_dict, course)
+    start = format_time(activity.start)
     title = f'{colour.value}{course.title}{config.TermColour.RESET.value}'
-    end = activity.end.strftime('%H:%M')
-    print(
-        f'{start} - {end} :: {title} {activity.name} @ {relevant_location.place}'
-    )
+    end = format_time(activity.end)
+    return f'{start} - {end} :: {title} {activity.name} @ {relevant_location.place}'
 
 
 def print_timeline(config_dict, date, activities):
@@ -120,16 +124,16 @@ def print_timeline(config_dict, date, activities):
         activities (list of (Course, Activity)): The activities for the current date. '''
     if len(activities) == 0:
         return
-    # Find the longest line (in terms of length on the canvas) of the
-    # activities and courses. This is to make the boxes as big as the
-    # longest line.
-    activities = [(course, activity, activity.location_valid_for(date))
+    # Imported here so commands that never render a canvas don't pay
+    # for pulling in drawille at startup.
+    from drawille import Canvas
+
+    from . import draw
+    # Resolve the location and format the start/end times once per
+    # activity up front; everything below reuses them.
+    activities = [(course, activity, activity.location_valid_for(date),
+                   format_time(activity.start), format_time(activity.end))
                   for course, activity in activities]
-    titles = (course.title for course, _, _ in activities)
-    names = (act.name for _, act, _ in activities)
-    locations = (location.place for _, _, location in activities)
-    box_width = max(
-        len(line) for line in itertools.chain(titles, names, locations)) * 4
     # The box height is determined by the number of lines
     # Our box will look like this:
     # title
@@ -140,19 +144,26 @@ def print_timeline(config_dict, date, activities):
     # So that's 5 lines times 5 (the height of the pixel in character
     # terms plus a little padding), 25 pixels height.
     box_height = 25
-    # Now we convert our (course, activity) pairs to text and bin our
-    # activities based on their start time.
-    mapping = OrderedDict()
-    for course, activity, location in activities:
-        key = activity.start.strftime('%H:%M')
-        map_bin = mapping.get(key, [])
-        activity_text = f'{course.title}\n\n{activity.name}\n{location.place}\n{activity.end:%H:%M}'
-        map_bin.append(activity_text)
-        mapping[key] = map_bin
+    # In a single pass, find the longest line (to make the boxes as
+    # big as the longest line) and bin the activity text by start
+    # time. Plain dicts preserve insertion order, which is all the
+    # timeline needs.
+    box_width = 0
+    mapping = {}
+    for course, activity, location, start, end in activities:
+        longest = max(
+            len(course.title), len(activity.name), len(location.place))
+        if longest > box_width:
+            box_width = longest
+        activity_text = f'{course.title}\n\n{activity.name}\n{location.place}\n{end}'
+        mapping.setdefault(start, []).append(activity_text)
+    box_width *= 4
 
     canvas = Canvas()
     draw.timeline(canvas, 0, 0, box_width, box_height, mapping)
-    print(canvas.frame())
+    # One buffered write; print() would walk the frame line by line
+    # through the stdout lock and add flushes of its own.
+    sys.stdout.write(canvas.frame() + '\n')
 
 
 def find_day_of_week(date, weekday):
@@ -160,49 +171,60 @@ def find_day_of_week(date, weekday):
 
 
 def print_week_timetable(config_dict, date, courses, selected_activities):
+    from drawille import Canvas
+
+    from . import draw
+    # Anchor the week on Monday once instead of recomputing
+    # date.weekday() for every day of the week.
+    monday = date - timedelta(days=date.weekday())
     dates = [
-        find_day_of_week(date, day)
+        monday + timedelta(days=day)
         for day in range(calendar.MONDAY, calendar.SATURDAY)
     ]
-    day_activities = list(
-        itertools.chain(*(
-            timetable.activities_on(courses, date, selected_activities)
-            for date in dates)))
+    day_lists = [
+        timetable.activities_on(courses, d, selected_activities)
+        for d in dates
+    ]
+    day_activities = list(itertools.chain.from_iterable(day_lists))
     if len(day_activities) == 0:
         return
-    earliest_time = min(day_activities, key=lambda act: act[1].start)[1].start
-    latest_time = max(day_activities, key=lambda act: act[1].end)[1].end
-    earliest_time = earliest_time.replace(minute=0, second=0)
+    # Track the earliest start and latest end in a single sweep rather
+    # than two keyed min/max passes.
+    earliest_time = latest_time = None
+    for _, activity in day_activities:
+        if earliest_time is None or activity.start < earliest_time:
+            earliest_time = activity.start
+        if latest_time is None or activity.end > latest_time:
+            latest_time = activity.end
+    # The table rows are whole hours, so bin activities by plain hour
+    # integers; round the end of the day up to the next full hour.
+    earliest_hour = earliest_time.hour
+    latest_hour = latest_time.hour
     if latest_time.minute + latest_time.second > 0:
-        latest_time = (latest_time + timedelta(hours=1)).replace(
-            minute=0, second=0)
+        latest_hour += 1
     rendered_activities = defaultdict(list)
     for course, activity in day_activities:
-        hours = activity.end.hour - activity.start.hour
-        for hour in range(hours):
-            dt = date.replace(hour=activity.start.hour, minute=0, second=0)
-            rendered_activities[(activity.day,
-                                 (dt + timedelta(hours=hour)).time()
-                                 )].append(f'{course.title} {activity.name}')
+        for hour in range(activity.start.hour, activity.end.hour):
+            rendered_activities[(activity.day, hour)].append(
+                f'{course.title} {activity.name}')
     rendered_timetable = [[''] + calendar.day_name[:5]]
 
-    hours = latest_time.hour - earliest_time.hour
-    for hour in range(hours):
-        e_dt = date.replace(hour=earliest_time.hour, minute=0, second=0)
-        dt = (e_dt + timedelta(hours=hour)).time()
-        row = [dt.strftime('%H:%M')]
+    for hour in range(earliest_hour, latest_hour):
+        row = [f'{hour:02d}:00']
         for day in range(len(calendar.day_name) - 2):
-            row.append('\n'.join(rendered_activities[(day, dt)]))
+            row.append('\n'.join(rendered_activities[(day, hour)]))
         rendered_timetable.append(row)
 
     canvas = Canvas()
     draw.table(canvas, 0, 0, rendered_timetable)
-    print(canvas.frame())
+    # One buffered write; print() would walk the frame line by line
+    # through the stdout lock and add flushes of its own.
+    sys.stdout.write(canvas.frame() + '\n')
 
 
 @command('week')
 def show_week(config_dict, courses, selected_activities, args):
-    date = args['--on'] or datetime.now()
+    date = args.on or datetime.now()
     print(f'Showing timetable for {date:week %U of %Y}')
     print_week_timetable(config_dict, date, courses, selected_activities)
 
@@ -219,16 +241,26 @@ def show_timetable(config_dict, courses, selected_activities, args):
         selected_activities (dict): A dictionary that determines what
                                     activities are selected by the user.
         args (dict): Additional command line arguments. '''
-    date = args['--on'] or datetime.now()
+    date = args.on or datetime.now()
     activities = timetable.activities_on(courses, date, selected_activities)
     day = calendar.day_name[date.weekday()]
     isodate = date.date().isoformat()
     print(f'Showing timetable for {day}, {isodate}')
-    if args['--timeline'] is True:
+    if args.timeline:
         print_timeline(config_dict, date, activities)
     else:
-        for course, activity in activities:
-            print_activity(config_dict, date, course, activity)
+        # Look up each course's colour once rather than per activity,
+        # then emit all the lines in one write.
+        colours = {
+            course.title: config.colour_of_course(config_dict, course)
+            for course, _ in activities
+        }
+        lines = [
+            format_activity(colours[course.title], date, course, activity)
+            for course, activity in activities
+        ]
+        if lines:
+            sys.stdout.write('\n'.join(lines) + '\n')
 
 
 @command('next')
@@ -244,46 +276,101 @@ def show_next(config_dict, courses, selected_activities, args):
                                     activities are selected by the user.
         args (dict): Additional command line arguments. '''
     now = datetime.now()
-    activities = timetable.activities_on(courses, now, selected_activities)
-    next_activity = next(((course, activity) for course, activity in activities
-                          if activity.start > now.time()), None)
-    if next_activity is not None and args['--time']:
+    # Filter to upcoming activities before the list is built and
+    # sorted, rather than discarding the past ones afterwards.
+    activities = timetable.activities_on(
+        courses, now, selected_activities, after=now.time())
+    next_activity = activities[0] if activities else None
+    if next_activity is not None and args.time:
         course, act = next_activity
         time_dt = now.replace(hour=act.start.hour, minute=act.start.minute)
         delta = time_dt - now
         print(delta)
     elif next_activity is not None:
         course, act = next_activity
-        print_activity(config_dict, now, course, act)
+        print(
+            format_activity(
+                config.colour_of_course(config_dict, course), now, course,
+                act))
+
+
+def build_parser():
+    ''' Build the argument parser for the command line interface.
+
+    Returns:
+        argparse.ArgumentParser: A parser covering all subcommands. '''
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--version', action='version', version='Timetable 0.1.0.')
+    parser.add_argument(
+        '-v', '--verbose', action='store_true', help='Be more verbose.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    show = subparsers.add_parser('show', help='Show the timetable for a day.')
+    show.add_argument(
+        '--on', type=datetime.fromisoformat, help='Show the timetable for this date.')
+    show.add_argument(
+        '-t',
+        '--timeline',
+        action='store_true',
+        help='Show your timetable in a fancy timeline.')
+    week = subparsers.add_parser(
+        'week', help='Show the timetable for a week.')
+    week.add_argument(
+        '--on', type=datetime.fromisoformat, help='Show the timetable for this date.')
+    next_parser = subparsers.add_parser('next', help='Show the next class.')
+    next_parser.add_argument(
+        '--time',
+        action='store_true',
+        help='Show the time to the next class.')
+    for subparser in (show, week, next_parser):
+        subparser.add_argument(
+            '--drop-cache',
+            action='store_true',
+            help='Drop the current data file.')
+    # Bind each subcommand straight to its callback so dispatch is a
+    # plain attribute access on the parsed arguments.
+    show.set_defaults(func=COMMAND_MAP['show'])
+    week.set_defaults(func=COMMAND_MAP['week'])
+    next_parser.set_defaults(func=COMMAND_MAP['next'])
+    return parser
 
 
 def main():
     ''' Main function. '''
-    arguments = docopt(__doc__, version='Timetable 0.1.0.')
-    try:
-        arguments = COMMAND_SCHEMA.validate(arguments)
-    except SchemaError:
-        exit(__doc__)
+    arguments = build_parser().parse_args()
     try:
         config_path, data, config_dict = get_config()
     except SchemaError as e:
-        if arguments['--verbose']:
+        if arguments.verbose:
             exit(e.code)
         else:
             exit('Failed to parse config.')
     courses = config.get_courses(config_dict)
-    if data is None or arguments['--drop-cache']:
-        for course in courses:
-            course.fetch_activities()
+    dirty = data is None or arguments.drop_cache
+    if dirty:
+        # The fetches are independent HTTP requests, so overlap their
+        # network latency across a few threads. The executor needs at
+        # least one worker, so skip it entirely for an empty config.
+        if courses:
+            with ThreadPoolExecutor(
+                    max_workers=min(8, len(courses))) as executor:
+                list(executor.map(timetable.Course.fetch_activities, courses))
     else:
         courses = data
     selected_activities = config.get_selected_activities(config_dict, courses)
-    # Find first callback that docopt believes has been called.
-    callback = next(callback for cmd, callback in COMMAND_MAP.items()
-                    if arguments[cmd] is True)
-    callback(config_dict, courses, selected_activities, arguments)
-    with open(config_path / 'data', 'wb') as out:
-        pickle.dump(courses, out)
+    arguments.func(config_dict, courses, selected_activities, arguments)
+    if dirty:
+        cache = {
+            'config_mtime': (config_path / 'config').stat().st_mtime,
+            'config': config.unstructure_config(config_dict),
+            'courses': [course.to_dict() for course in courses]
+        }
+        # Write via a temp file and rename so a crash mid-write can't
+        # leave a truncated data file behind.
+        tmp_path = config_path / 'data.tmp'
+        with open(tmp_path, 'w') as out:
+            json.dump(cache, out)
+        os.replace(tmp_path, config_path / 'data')
 
 
 if __name__ == '__main__':
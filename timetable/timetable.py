@@ -1,7 +1,7 @@
 import calendar
 import itertools
 import re
-from datetime import datetime
+from datetime import date, datetime, time
 
 import attr
 from requests_html import HTMLSession
@@ -65,6 +65,32 @@ def date_in_intervals(date, intervals):
     return len(intervals) == 0
 
 
+def unstructure_intervals(intervals):
+    ''' Convert a list of date intervals into json-compatible types.
+
+    Args:
+        intervals (list of (date, date)): The intervals to convert.
+
+    Returns:
+        list of list of str: The intervals with each date replaced by
+                             its isoformat string. '''
+    return [[d.isoformat() for d in interval] for interval in intervals]
+
+
+def structure_intervals(interval_lists):
+    ''' Convert the output of unstructure_intervals back into date intervals.
+
+    Args:
+        interval_lists (list of list of str): The intervals to convert.
+
+    Returns:
+        list of (date, date): The parsed intervals. '''
+    return [
+        tuple(date.fromisoformat(d) for d in interval)
+        for interval in interval_lists
+    ]
+
+
 def parse_id(id_string):
     ''' Parse an activity id into a tuple of integers that logically represent it.
 
@@ -104,7 +130,7 @@ def parse_id(id_string):
     return (int(match_dict['id']), int(id_part) if id_part else id_part)
 
 
-@attr.s
+@attr.s(slots=True)
 class Location:
     ''' The location class represents a single location a class may occur in.
 
@@ -156,6 +182,28 @@ class Location:
             ]
             return cls(name, valid_intervals)
 
+    def to_dict(self):
+        ''' Convert the Location into json-compatible types.
+
+        Returns:
+            dict: The Location as plain dicts, lists and strings. '''
+        return {
+            'place': self.place,
+            'valid_intervals': unstructure_intervals(self.valid_intervals)
+        }
+
+    @classmethod
+    def from_dict(cls, location_dict):
+        ''' Reconstruct a Location from the output of to_dict.
+
+        Args:
+            location_dict (dict): The dictionary to reconstruct from.
+
+        Returns:
+            Location: The reconstructed location. '''
+        return cls(location_dict['place'],
+                   structure_intervals(location_dict['valid_intervals']))
+
     def valid_for(self, date):
         ''' Determine if a Location is valid on a given date.
 
@@ -176,7 +224,7 @@ class Location:
         return date_in_intervals(date.date(), self.valid_intervals)
 
 
-@attr.s
+@attr.s(slots=True)
 class Activity:
     ''' The Activity class represents a single activity in a course.
 
@@ -244,6 +292,39 @@ class Activity:
         return cls(act_id, name, activity_day.text.strip(), start_time,
                    end_time, valid_intervals, locations)
 
+    def to_dict(self):
+        ''' Convert the Activity into json-compatible types.
+
+        Returns:
+            dict: The Activity as plain dicts, lists and strings. '''
+        return {
+            'activity_id': list(self.activity_id),
+            'name': self.name,
+            'day': calendar.day_name[self.day],
+            'start': self.start.isoformat(),
+            'end': self.end.isoformat(),
+            'valid_intervals': unstructure_intervals(self.valid_intervals),
+            'locations': [location.to_dict() for location in self.locations]
+        }
+
+    @classmethod
+    def from_dict(cls, activity_dict):
+        ''' Reconstruct an Activity from the output of to_dict.
+
+        Args:
+            activity_dict (dict): The dictionary to reconstruct from.
+
+        Returns:
+            Activity: The reconstructed activity. '''
+        return cls(
+            tuple(activity_dict['activity_id']), activity_dict['name'],
+            activity_dict['day'], time.fromisoformat(activity_dict['start']),
+            time.fromisoformat(activity_dict['end']),
+            structure_intervals(activity_dict['valid_intervals']), [
+                Location.from_dict(location)
+                for location in activity_dict['locations']
+            ])
+
     def valid_for(self, date):
         ''' Return True if an Activity is valid on a particular date.
 
@@ -267,7 +348,7 @@ class Activity:
                     None)
 
 
-@attr.s
+@attr.s(slots=True)
 class Course:
     ''' The Course class represents a single Course, and contains it's activities.
 
@@ -310,6 +391,33 @@ class Course:
                 for section, e in activities
             ]
 
+    def to_dict(self):
+        ''' Convert the Course into json-compatible types.
+
+        Returns:
+            dict: The Course as plain dicts, lists and strings. '''
+        return {
+            'title': self.title,
+            'year': self.year,
+            'semester': self.semester,
+            'activities': [activity.to_dict() for activity in self.activities]
+        }
+
+    @classmethod
+    def from_dict(cls, course_dict):
+        ''' Reconstruct a Course from the output of to_dict.
+
+        Args:
+            course_dict (dict): The dictionary to reconstruct from.
+
+        Returns:
+            Course: The reconstructed course. '''
+        return cls(course_dict['title'], course_dict['year'],
+                   course_dict['semester'], [
+                       Activity.from_dict(activity)
+                       for activity in course_dict['activities']
+                   ])
+
     def activities_on(self, date):
         ''' Return a list of activities on a particular day, in sorted order.
 
@@ -323,7 +431,7 @@ class Course:
         return sorted(activities, key=lambda act: act.start)
 
 
-def activities_on(courses, date, selected_activities):
+def activities_on(courses, date, selected_activities, after=None):
     '''Return all relevant activities from a given list of courses.
 
     "relevant" is defined to be any activity that is actually on the
@@ -336,6 +444,8 @@ def activities_on(courses, date, selected_activities):
                                     title, activity name) pairs to the
                                     id of the chosen activity by the
                                     student.
+        after (datetime.time): If given, only keep activities starting
+                               strictly after this time of day.
     Returns:
         list of (timetable.Course, timetable.Activity): The relevant activities. '''
     # Chain all course activities such they are an iterable in the
@@ -351,6 +461,7 @@ def activities_on(courses, date, selected_activities):
         (course, activity) for course, activity in activities
         if activity.activity_id[0] == selected_activities.get((
             course.title, activity.name), 1) and activity.valid_for(date)
+        and (after is None or activity.start > after)
     ]
     # Sort the activities by their start date
     return sorted(filtered_activities, key=lambda capair: capair[1].start)